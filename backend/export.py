@@ -8,21 +8,69 @@ replaced with placeholder HTML since they would make exports too large.
 """
 
 import base64
+import functools
+import html
+import json
 import logging
+import os
 import re
+import stat
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import mimetypes
 
-# Import shared media type definitions and scanner from utils to avoid duplication
-from backend.utils import MEDIA_EXTENSIONS, get_media_type, scan_notes_fast_walk
+# SIMD-accelerated base64 when available; the encoding is byte-identical.
+# pybase64 can also return str directly, skipping the bytes -> str decode.
+try:
+    from pybase64 import b64encode_as_string as _b64encode_ascii
+except ImportError:
+    def _b64encode_ascii(data: bytes) -> str:
+        return base64.b64encode(data).decode('ascii')
+
+# Import shared media type definitions from utils to avoid duplication
+from backend.utils import MEDIA_EXTENSIONS, get_media_type, _scan_generation
 
 logger = logging.getLogger("uvicorn.error")
 
+# An export classifies every reference at least twice (prefetch + replace) and
+# notes repeat the same few names, so memoize the name -> type lookups.
+# Keyed on the full name, not the extension: get_media_type also looks at the
+# basename (drawing-*.png).
+_media_type = functools.lru_cache(maxsize=1024)(get_media_type)
+_guess_mime_type = functools.lru_cache(maxsize=1024)(mimetypes.guess_type)
+
 
 # Regex used by parse_image_size_spec — see docstring below.
 _SIZE_RE = re.compile(r'^(\d+)(?:[xX](\d+))?$')
 
+# Media/link patterns, compiled once at import instead of on every export.
+# Wikilink media ![[file|alt]] and standard images ![alt](path) share one
+# alternation so the note body is scanned once; named groups tell them apart.
+# Targets/paths are capped at 4096 chars and alt/display text at 2048: an
+# unclosed `![` or `[[` then costs a bounded scan instead of one running to
+# the end of the note (quadratic with many of them). Inline data: URLs longer
+# than the cap simply don't match, which leaves them untouched as before.
+_MEDIA_RE = re.compile(
+    r'!\[\[(?P<wl>[^\]|]{1,4096})(?:\|(?P<wla>[^\]]{1,2048}))?\]\]'
+    r'|!\[(?P<alt>[^\]]{0,2048})\]\((?P<path>[^)]{1,4096})\)'
+)
+_WIKILINK_RE = re.compile(r'(?<!!)\[\[([^\]|]{1,4096})(?:\|([^\]]{1,2048}))?\]\]')
+_FENCED_CODE_RE = re.compile(r'```[\s\S]*?```')
+_INLINE_CODE_RE = re.compile(r'`[^`]+`')
+_CODE_PLACEHOLDER_RE = re.compile(r'\x00CODEBLOCK(\d+)\x00')
+# Leading blockquote / list item markers (with an optional task checkbox):
+# what marked.js and the callout preprocessor strip before a line's content.
+_CONTAINER_PREFIX_RE = re.compile(
+    r'(?:[ \t]*(?:>|(?:[-*+]|\d{1,9}[.)])(?:[ \t]+\[[ xX]\])?(?=[ \t])))*[ \t]*'
+)
+
+# Read size for base64 embedding; a multiple of 3 so chunks encode without padding.
+_BASE64_CHUNK_SIZE = 3 * 64 * 1024
+
 
 def parse_image_size_spec(text: str, allow_solo: bool = False) -> Tuple[str, Optional[int], Optional[int]]:
     """
@@ -71,29 +119,47 @@ def parse_image_size_spec(text: str, allow_solo: bool = False) -> Tuple[str, Opt
     )
 
 
+def _is_regular_file(path) -> bool:
+    """exists() + is_file() with a single stat call."""
+    try:
+        return stat.S_ISREG(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
 def get_media_as_base64(media_path: Path) -> Optional[Tuple[str, str]]:
     """
     Read a media file and return it as a base64 data URL.
     Returns tuple of (base64_url, media_type) or None if failed.
     """
-    if not media_path.exists() or not media_path.is_file():
+    if not _is_regular_file(media_path):
         return None
     
     # Get MIME type
-    mime_type, _ = mimetypes.guess_type(str(media_path))
+    mime_type, _ = _guess_mime_type(str(media_path))
     if not mime_type:
         return None
     
     # Determine media type
-    media_type = get_media_type(media_path.name)
+    media_type = _media_type(media_path.name)
     if not media_type:
         return None
     
     try:
+        # Encode in 3-byte-aligned chunks so the raw file is never held in
+        # memory alongside its full base64 expansion. Chunks are read into one
+        # reusable buffer; a buffered readinto() only comes up short at EOF,
+        # so padding can only appear in the last chunk.
+        parts = [f"data:{mime_type};base64,"]
+        buf = bytearray(_BASE64_CHUNK_SIZE)
+        view = memoryview(buf)
         with open(media_path, 'rb') as f:
-            media_data = f.read()
-        base64_data = base64.b64encode(media_data).decode('utf-8')
-        return (f"data:{mime_type};base64,{base64_data}", media_type)
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                parts.append(_b64encode_ascii(view[:n]))
+        return (''.join(parts), media_type)
     except Exception as e:
         logger.error("Failed to read media %s: %s", media_path, e)
         return None
@@ -112,33 +178,144 @@ def strip_frontmatter(content: str) -> str:
     """
     Remove YAML frontmatter from markdown content.
     Frontmatter is delimited by --- at the start and end.
-    """
-    if not content.strip().startswith('---'):
-        return content
     
-    lines = content.split('\n')
-    if lines[0].strip() != '---':
+    Locates the delimiter lines with str.find instead of splitting the whole
+    note into lines, so notes without frontmatter cost one short scan.
+    """
+    first_nl = content.find('\n')
+    if first_nl == -1:
         return content
-    
-    # Find closing ---
-    end_idx = -1
-    for i in range(1, len(lines)):
-        if lines[i].strip() == '---':
-            end_idx = i
-            break
-    
-    if end_idx == -1:
+    if content[:first_nl].strip() != '---':
         return content
     
-    # Remove frontmatter and return the rest
-    return '\n'.join(lines[end_idx + 1:]).strip()
+    # Find closing --- (a line that is only --- once whitespace is stripped)
+    pos = first_nl + 1
+    while True:
+        idx = content.find('---', pos)
+        if idx == -1:
+            return content
+        line_start = content.rfind('\n', 0, idx) + 1
+        line_end = content.find('\n', idx)
+        if line_end == -1:
+            line_end = len(content)
+        if content[line_start:line_end].strip() == '---':
+            # Remove frontmatter and return the rest
+            return content[line_end + 1:].strip()
+        pos = line_end + 1
+
+
 
+# ============================================================================
+# Attachment index
+#
+# The attachment fallback used to rescan the whole vault on every miss. Instead
+# we keep one {file name: [paths]} map of everything inside `_attachments` folders
+# per vault. Like the scan cache in utils.py it is dropped on every mutation:
+# entries record the utils invalidation generation, which each save, upload,
+# move and delete handler bumps through _scan_cache_invalidate(). For changes
+# made outside the app, entries are also stamped with the mtimes of every
+# directory the walk visited, so a new file or a new `_attachments` folder
+# anywhere in the vault triggers a rebuild on the next lookup. Since mutations
+# made through the app clear the index immediately, a stamp verified within the
+# last second is trusted, like the scan cache's 1 s TTL; the many lookups of a
+# single export then stat the vault's folders only once.
+# ============================================================================
 
-def find_media_in_attachments(media_name: str, note_folder: Path, notes_dir: Path) -> Optional[Path]:
+_ATTACHMENT_INDEX_LOCK = threading.Lock()
+_ATTACHMENT_INDEX_RECHECK_SECONDS = 1.0
+# key: resolved_notes_dir -> (checked_at_monotonic_seconds, generation, stamp,
+#                             walked_dirs, attachment_dirs, {file name: [paths]})
+_ATTACHMENT_INDEX_CACHE: Dict[str, Tuple[float, int, tuple, List[str], List[str], Dict[str, List[Path]]]] = {}
+
+
+def _attachment_index_stamp(walked_dirs: List[str]) -> Optional[tuple]:
+    try:
+        return tuple(os.stat(d).st_mtime_ns for d in walked_dirs)
+    except OSError:
+        return None
+
+
+def _get_attachment_index(resolved_notes_dir: Path) -> Tuple[List[str], Dict[str, List[Path]]]:
+    """
+    Return (attachment_dirs, {file name: [paths]}) for every `_attachments`
+    folder in the vault, rebuilding after a mutation or when the mtime stamp
+    has changed. Folders and the paths for a name are ordered by vault-relative
+    folder path, the order scan_notes_fast_walk returned them in, so the
+    alphabetically first `_attachments` folder wins as before.
+    """
+    root = str(resolved_notes_dir)
+    now = time.monotonic()
+    generation = _scan_generation()
+    with _ATTACHMENT_INDEX_LOCK:
+        entry = _ATTACHMENT_INDEX_CACHE.get(root)
+    if entry is not None and entry[1] == generation:
+        checked_at, _, stamp, walked_dirs, attachment_dirs, index = entry
+        if stamp is not None and (now - checked_at) <= _ATTACHMENT_INDEX_RECHECK_SECONDS:
+            return attachment_dirs, index
+        if stamp is not None and _attachment_index_stamp(walked_dirs) == stamp:
+            with _ATTACHMENT_INDEX_LOCK:
+                _ATTACHMENT_INDEX_CACHE[root] = (now, generation, stamp, walked_dirs, attachment_dirs, index)
+            return attachment_dirs, index
+
+    # Walk with an os.scandir stack: DirEntry type checks come from the
+    # directory read itself, and only `_attachments` folders record files.
+    # Visit order doesn't matter; the results are sorted below.
+    walked_dirs = []
+    attachment_dirs = []
+    index = {}
+    stack = [root]
+    while stack:
+        dirpath = stack.pop()
+        walked_dirs.append(dirpath)
+        in_attachments = os.path.basename(dirpath) == '_attachments'
+        if in_attachments:
+            attachment_dirs.append(dirpath)
+        subdirs = []
+        try:
+            with os.scandir(dirpath) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith('.'):
+                            subdirs.append(entry.path)
+                    elif in_attachments and entry.is_file():
+                        index.setdefault(entry.name, []).append(Path(entry.path))
+        except OSError:
+            continue
+        stack.extend(subdirs)
+
+    # Listing order is filesystem-dependent; sort like the old fallback did.
+    def folder_key(dirpath: str) -> str:
+        return Path(dirpath).relative_to(root).as_posix()
+
+    attachment_dirs.sort(key=folder_key)
+    for paths in index.values():
+        if len(paths) > 1:
+            paths.sort(key=lambda p: folder_key(str(p.parent)))
+
+    stamp = _attachment_index_stamp(walked_dirs)
+    with _ATTACHMENT_INDEX_LOCK:
+        _ATTACHMENT_INDEX_CACHE[root] = (now, generation, stamp, walked_dirs, attachment_dirs, index)
+    return attachment_dirs, index
+
+
+def find_media_in_attachments(
+    media_name: str,
+    note_folder: Path,
+    notes_dir: Path,
+    resolved_notes_dir: Optional[Path] = None
+) -> Optional[Path]:
     """
     Search for a media file in common attachment locations.
     Returns the resolved path if found, None otherwise.
+    
+    resolved_notes_dir lets callers doing many lookups pass notes_dir.resolve()
+    once instead of paying for it on every candidate.
     """
+    if resolved_notes_dir is None:
+        resolved_notes_dir = notes_dir.resolve()
+    # Containment is a plain prefix test; both sides are fully resolved
+    notes_prefix = os.path.join(str(resolved_notes_dir), '')
+    
     # Common locations to search for media (fast path)
     search_paths = [
         note_folder / media_name,                          # Same folder as note
@@ -146,45 +323,87 @@ def find_media_in_attachments(media_name: str, note_folder: Path, notes_dir: Pat
         notes_dir / '_attachments' / media_name,           # Root _attachments folder
     ]
     
-    # Also search in parent folders' _attachments (for nested notes)
-    current = note_folder
-    while current != notes_dir and current.parent != current:
+    # Also search in parent folders' _attachments (for nested notes).
+    # The note's own folder is already listed above, so start at its parent.
+    current = note_folder.parent
+    while note_folder != notes_dir and current != notes_dir and current.parent != current:
         search_paths.append(current / '_attachments' / media_name)
         current = current.parent
     
+    # A note at the vault root yields the same _attachments path twice
+    seen = set()
     for path in search_paths:
-        resolved = path.resolve()
-        if resolved.exists() and resolved.is_file():
-            # Security: ensure path is within notes_dir
-            try:
-                resolved.relative_to(notes_dir.resolve())
-                return resolved
-            except ValueError:
-                continue
+        if path in seen:
+            continue
+        seen.add(path)
+        # Most candidates don't exist: one stat rules them out before paying
+        # for realpath's per-component lookups
+        if not _is_regular_file(path):
+            continue
+        resolved = os.path.realpath(path)
+        # Security: ensure path is within notes_dir
+        if not resolved.startswith(notes_prefix):
+            continue
+        return Path(resolved)
     
-    # Fallback: search all _attachments folders recursively (slower but thorough)
+    # Fallback: look the name up in the cached index of all _attachments folders
     # This handles cross-folder media references like in Obsidian
     try:
-        _files, folders = scan_notes_fast_walk(str(notes_dir), include_media=False)
-        for folder in folders:
-            if folder == '_attachments' or folder.endswith('/_attachments'):
-                attachment_folder = notes_dir / folder
-                candidate = attachment_folder / media_name
-                if candidate.exists() and candidate.is_file():
-                    try:
-                        candidate.resolve().relative_to(notes_dir.resolve())
-                        return candidate.resolve()
-                    except ValueError:
-                        continue
+        attachment_dirs, index = _get_attachment_index(resolved_notes_dir)
+        if '/' in media_name or os.sep in media_name:
+            candidates = [Path(d) / media_name for d in attachment_dirs]
+        else:
+            candidates = index.get(media_name, ())
+        for candidate in candidates:
+            if not _is_regular_file(candidate):
+                continue
+            resolved = os.path.realpath(candidate)
+            if not resolved.startswith(notes_prefix):
+                continue
+            return Path(resolved)
     except Exception:
-        pass  # Ignore errors in recursive search
+        pass  # Ignore errors in attachment index lookup
     
     return None
 
 
 # Legacy alias
-def find_image_in_attachments(image_name: str, note_folder: Path, notes_dir: Path) -> Optional[Path]:
-    return find_media_in_attachments(image_name, note_folder, notes_dir)
+def find_image_in_attachments(
+    image_name: str,
+    note_folder: Path,
+    notes_dir: Path,
+    resolved_notes_dir: Optional[Path] = None
+) -> Optional[Path]:
+    return find_media_in_attachments(image_name, note_folder, notes_dir, resolved_notes_dir)
+
+
+def _image_html(src: str, alt_text: str, match: re.Match) -> str:
+    """
+    Render an embedded image for the exported markdown.
+    
+    Emits a raw <img> tag so marked.js passes the (potentially multi-MB) data
+    URL straight through instead of running its inline tokenizer over it.
+    Falls back to markdown image syntax when the tag would sit alone at the
+    start of a line that continues the paragraph: CommonMark treats such a
+    line as the start of a raw HTML block, which would stop the following
+    lines from being rendered as markdown. Blockquote, callout and list
+    markers are ignored on both lines, since the line content is what
+    starts the block once they are stripped.
+    """
+    text = match.string
+    line_start = text.rfind('\n', 0, match.start()) + 1
+    line_end = text.find('\n', match.end())
+    prefix = text[line_start:match.start()]
+    alone_on_line = (
+        _CONTAINER_PREFIX_RE.match(prefix).end() == len(prefix)
+        and not text[match.end():line_end if line_end != -1 else len(text)].strip(' \t')
+    )
+    if alone_on_line and line_end != -1:
+        next_end = text.find('\n', line_end + 1)
+        next_line = text[line_end + 1:next_end if next_end != -1 else len(text)]
+        if next_line[_CONTAINER_PREFIX_RE.match(next_line).end():].strip():
+            return f'![{alt_text}]({src})'
+    return f'<img src="{src}" alt="{html.escape(alt_text, quote=True)}" loading="lazy">'
 
 
 def generate_media_placeholder(media_type: str, alt_text: str) -> str:
@@ -205,7 +424,13 @@ def generate_media_placeholder(media_type: str, alt_text: str) -> str:
 </div>'''
 
 
-def process_media_for_export(markdown_content: str, note_folder: Path, notes_dir: Path) -> str:
+def process_media_for_export(
+    markdown_content: str,
+    note_folder: Path,
+    notes_dir: Path,
+    media_url_prefix: Optional[str] = None,
+    sidecar_files: Optional[Dict[str, Path]] = None
+) -> str:
     """
     Process all media references in markdown for standalone HTML export.
     
@@ -216,24 +441,125 @@ def process_media_for_export(markdown_content: str, note_folder: Path, notes_dir
     Behavior by media type:
     - Images (jpg, png, gif, webp): Embedded as base64 data URLs
     - Audio/Video/PDF: Replaced with styled placeholder HTML (not embedded - too large)
+    
+    If media_url_prefix is given, images are not embedded; they are linked as
+    media_url_prefix + <path relative to notes_dir> instead, and each linked
+    file is recorded in sidecar_files (relative path -> resolved path).
     """
+    # Fast path: plain prose with no image syntax needs no regex sweep at all
+    if '![' not in markdown_content:
+        return markdown_content
+    
+    # Pasted notes often carry images already inlined as data URLs. With no
+    # wikilink media and every `](` target being a data URL, no match could
+    # be rewritten, so skip the regex pass entirely.
+    if '![[' not in markdown_content and markdown_content.count('](') == markdown_content.count('](data:'):
+        return markdown_content
+    
+    # Resolved once per export; every containment check below compares against it
+    resolved_notes_dir = notes_dir.resolve()
+    notes_prefix = os.path.join(str(resolved_notes_dir), '')
+    
+    # Per-export caches: a note often references the same image many times,
+    # so each name is searched for and each file encoded at most once.
+    # Misses are cached too (stored as None): a broken link repeated across
+    # the note walks the search paths and the attachment index only once.
+    found_cache: dict = {}
+    local_cache: dict = {}
+    embed_cache: dict = {}
+    
+    def find_cached(media_name):
+        if media_name not in found_cache:
+            found_cache[media_name] = find_media_in_attachments(
+                media_name, note_folder, notes_dir, resolved_notes_dir
+            )
+        return found_cache[media_name]
+    
+    def resolve_local_cached(media_path):
+        """Resolve a standard ![alt](path) image to a file inside notes_dir, or None."""
+        if media_path in local_cache:
+            return local_cache[media_path]
+        # Handle /api/media/ or legacy /api/images/ paths (convert to filesystem paths)
+        if media_path.startswith('/api/media/'):
+            relative_path = media_path[len('/api/media/'):]
+            resolved = os.path.realpath(notes_dir / relative_path)
+        elif media_path.startswith('/api/images/'):
+            # Legacy path support for backward compatibility
+            relative_path = media_path[len('/api/images/'):]
+            resolved = os.path.realpath(notes_dir / relative_path)
+        else:
+            # Try to resolve the media path relative to note folder
+            resolved = os.path.realpath(note_folder / media_path)
+        
+        if os.path.exists(resolved):
+            # Security: ensure path is within notes_dir
+            resolved_path = Path(resolved) if resolved.startswith(notes_prefix) else None
+        else:
+            # If not found, try the attachment search (already contained)
+            resolved_path = find_cached(Path(media_path).name)
+        
+        local_cache[media_path] = resolved_path
+        return resolved_path
+    
+    def link_image(resolved_path):
+        """URL for an image served next to the page instead of embedded."""
+        if _media_type(resolved_path.name) not in ('image', 'drawing'):
+            return None
+        relative_path = resolved_path.relative_to(resolved_notes_dir).as_posix()
+        if sidecar_files is not None:
+            sidecar_files[relative_path] = resolved_path
+        return media_url_prefix + urllib.parse.quote(relative_path)
+    
+    def embed_cached(resolved_path):
+        if resolved_path not in embed_cache:
+            if media_url_prefix is not None:
+                embed_cache[resolved_path] = link_image(resolved_path)
+            else:
+                embed_cache[resolved_path] = get_image_as_base64(resolved_path)
+        return embed_cache[resolved_path]
     
-    # First, handle wikilink media: ![[file.png]] or ![[file.mp3|alt text]]
+    def image_path_for(match):
+        """The local image file a match would embed, mirroring the replacers below."""
+        if match.group('wl') is not None:
+            media_name = match.group('wl').strip()
+            if _media_type(media_name) in ('audio', 'video', 'document'):
+                return None
+            return find_cached(media_name)
+        media_path = match.group('path')
+        if not media_path or media_path.startswith(('data:', 'http://', 'https://')):
+            return None
+        if _media_type(media_path) in ('audio', 'video', 'document'):
+            return None
+        return resolve_local_cached(media_path)
+    
+    # Notes with several images: read and encode the distinct files in
+    # parallel up front (file reads and base64 release the GIL), so the
+    # substitution pass below only does cache lookups.
+    if media_url_prefix is None and markdown_content.count('![') > 1:
+        pending = list(dict.fromkeys(
+            image_path
+            for image_path in map(image_path_for, _MEDIA_RE.finditer(markdown_content))
+            if image_path
+        ))
+        if len(pending) > 1:
+            workers = min(8, len(pending), (os.cpu_count() or 4))
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                embed_cache.update(zip(pending, ex.map(get_image_as_base64, pending)))
+    
+    # Wikilink media: ![[file.png]] or ![[file.mp3|alt text]]
     # Also supports Obsidian-style inline sizing:
     #   ![[img.jpg|100]]           -> width 100
     #   ![[img.jpg|100x200]]       -> width 100, height 200
     #   ![[img.jpg|caption|100]]   -> alt "caption", width 100
-    wikilink_pattern = r'!\[\[([^\]|]+)(?:\|([^\]]+))?\]\]'
-    
     def replace_wikilink_media(match):
-        media_name = match.group(1).strip()
-        raw_alt = match.group(2).strip() if match.group(2) else ''
+        media_name = match.group('wl').strip()
+        raw_alt = match.group('wla').strip() if match.group('wla') else ''
         # Wikilink alt-group: solo `|<digits>` is a size, no ambiguity.
         clean_alt, width, height = parse_image_size_spec(raw_alt, allow_solo=True)
         alt_text = clean_alt if clean_alt else media_name.split('/')[-1].rsplit('.', 1)[0]
         
         # Check media type first
-        media_type = get_media_type(media_name)
+        media_type = _media_type(media_name)
         
         # For non-image media (audio, video, PDF), show placeholder without embedding.
         # Size specs are silently dropped — they only make sense for images.
@@ -241,15 +567,14 @@ def process_media_for_export(markdown_content: str, note_folder: Path, notes_dir
             return generate_media_placeholder(media_type, alt_text)
         
         # For images, embed as base64
-        resolved_path = find_media_in_attachments(media_name, note_folder, notes_dir)
+        resolved_path = find_cached(media_name)
         
         if resolved_path:
-            base64_url = get_image_as_base64(resolved_path)
+            base64_url = embed_cached(resolved_path)
             if base64_url:
                 # If a size was specified, emit raw <img> HTML directly so the
                 # dimensions survive the markdown round-trip. Marked.js passes
                 # raw HTML through and DOMPurify allows width/height on <img>.
-                # Without size, keep emitting standard markdown for consistency.
                 if width or height:
                     safe_alt = alt_text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
                     # Emit width/height as BOTH attributes and inline style; the
@@ -267,24 +592,24 @@ def process_media_for_export(markdown_content: str, note_folder: Path, notes_dir
                     if style_pieces:
                         size_attrs += f' style="{";".join(style_pieces)}"'
                     return f'<img src="{base64_url}" alt="{safe_alt}" title="{safe_alt}"{size_attrs}>'
-                return f'![{alt_text}]({base64_url})'
+                return _image_html(base64_url, alt_text, match)
         
         # Image not found
         return f'<span style="color:var(--text-tertiary,#999);opacity:0.7;" title="Image not found">🖼️ {alt_text}</span>'
     
-    markdown_content = re.sub(wikilink_pattern, replace_wikilink_media, markdown_content)
-    
-    # Then, handle standard markdown images: ![alt](path)
-    img_pattern = r'!\[([^\]]*)\]\(([^)]+)\)'
-    
+    # Standard markdown images: ![alt](path)
     def replace_media(match):
-        alt_text = match.group(1)
-        media_path = match.group(2)
+        alt_text = match.group('alt')
+        media_path = match.group('path')
+        
+        # Skip already-embedded base64
+        if media_path.startswith('data:'):
+            return match.group(0)
         
         # Handle external URLs
         if media_path.startswith(('http://', 'https://')):
             # Check if it's a PDF - generate styled external link
-            media_type = get_media_type(media_path)
+            media_type = _media_type(media_path)
             if media_type == 'document':
                 display_name = alt_text or Path(media_path).stem
                 safe_name = display_name.replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
@@ -296,16 +621,12 @@ def process_media_for_export(markdown_content: str, note_folder: Path, notes_dir
             # Other external media: keep as-is (will show as broken image)
             return match.group(0)
         
-        # Skip already-embedded base64
-        if media_path.startswith('data:'):
-            return match.group(0)
-        
         # Skip empty paths (from failed wikilink conversion)
         if not media_path:
             return match.group(0)
         
         # Check media type first
-        media_type = get_media_type(media_path)
+        media_type = _media_type(media_path)
         display_alt = alt_text or Path(media_path).stem
         
         # For non-image media (audio, video, PDF), show placeholder without embedding
@@ -313,47 +634,47 @@ def process_media_for_export(markdown_content: str, note_folder: Path, notes_dir
             return generate_media_placeholder(media_type, display_alt)
         
         # For images, proceed with base64 embedding
-        # Handle /api/media/ or legacy /api/images/ paths (convert to filesystem paths)
-        if media_path.startswith('/api/media/'):
-            relative_path = media_path[len('/api/media/'):]
-            resolved_path = (notes_dir / relative_path).resolve()
-        elif media_path.startswith('/api/images/'):
-            # Legacy path support for backward compatibility
-            relative_path = media_path[len('/api/images/'):]
-            resolved_path = (notes_dir / relative_path).resolve()
-        else:
-            # Try to resolve the media path relative to note folder
-            resolved_path = (note_folder / media_path).resolve()
-        
-        # If not found, try the attachment search
-        if not resolved_path.exists():
-            # Extract just the filename and search
-            media_name = Path(media_path).name
-            resolved_path = find_media_in_attachments(media_name, note_folder, notes_dir)
-            if not resolved_path:
-                return match.group(0)  # Keep original if not found
-        
-        # Security: ensure path is within notes_dir
-        try:
-            resolved_path.relative_to(notes_dir.resolve())
-        except ValueError:
-            # Path is outside notes_dir, skip
-            return match.group(0)
+        resolved_path = resolve_local_cached(media_path)
+        if not resolved_path:
+            return match.group(0)  # Keep original if not found or outside notes_dir
         
         # Get base64 data for image
-        base64_url = get_image_as_base64(resolved_path)
+        base64_url = embed_cached(resolved_path)
         if base64_url:
-            return f'![{display_alt}]({base64_url})'
+            return _image_html(base64_url, display_alt, match)
         
         # Image not found, keep original
         return match.group(0)
     
-    markdown_content = re.sub(img_pattern, replace_media, markdown_content)
+    def replace_any_media(match):
+        if match.group('wl') is not None:
+            return replace_wikilink_media(match)
+        return replace_media(match)
     
-    return markdown_content
+    return _MEDIA_RE.sub(replace_any_media, markdown_content)
+
+
+def collect_images_as_sidecar(
+    markdown_content: str,
+    note_folder: Path,
+    notes_dir: Path,
+    media_url_prefix: str
+) -> Tuple[str, Dict[str, Path]]:
+    """
+    Like process_media_for_export, but link local images instead of embedding.
+    
+    Returns (rewritten_markdown, {relative_path: resolved_path}) so the caller
+    can serve exactly the referenced files, e.g. for public share pages where
+    base64 would inflate every page load and defeat browser caching.
+    """
+    sidecar_files: Dict[str, Path] = {}
+    rewritten = process_media_for_export(
+        markdown_content, note_folder, notes_dir,
+        media_url_prefix=media_url_prefix, sidecar_files=sidecar_files
+    )
+    return rewritten, sidecar_files
 
 
-# Legacy alias for backward compatibility
 # Legacy alias for backward compatibility
 def embed_images_as_base64(markdown_content: str, note_folder: Path, notes_dir: Path) -> str:
     """Alias for process_media_for_export (legacy name kept for compatibility)."""
@@ -367,7 +688,8 @@ def convert_wikilinks_to_html(markdown_content: str) -> str:
     Wikilinks inside fenced or inline code are left literal, mirroring the
     in-app preview pipeline.
     """
-    wikilink_pattern = r'(?<!!)\[\[([^\]|]+)(?:\|([^\]]+))?\]\]'
+    if '[[' not in markdown_content:
+        return markdown_content
 
     def replace_wikilink(match):
         target = match.group(1).strip()
@@ -380,47 +702,34 @@ def convert_wikilinks_to_html(markdown_content: str) -> str:
         code_blocks.append(match.group(0))
         return f"\x00CODEBLOCK{len(code_blocks) - 1}\x00"
 
-    protected = re.sub(r'```[\s\S]*?```', stash, markdown_content)
-    protected = re.sub(r'`[^`]+`', stash, protected)
-    converted = re.sub(wikilink_pattern, replace_wikilink, protected)
-    return re.sub(r'\x00CODEBLOCK(\d+)\x00', lambda m: code_blocks[int(m.group(1))], converted)
+    # Code stashing is only needed when the note has backticks at all
+    if '`' not in markdown_content:
+        return _WIKILINK_RE.sub(replace_wikilink, markdown_content)
 
+    protected = markdown_content
+    if '```' in protected:
+        protected = _FENCED_CODE_RE.sub(stash, protected)
+    protected = _INLINE_CODE_RE.sub(stash, protected)
+    converted = _WIKILINK_RE.sub(replace_wikilink, protected)
+    if not code_blocks:
+        return converted
+    return _CODE_PLACEHOLDER_RE.sub(lambda m: code_blocks[int(m.group(1))], converted)
 
-def generate_export_html(
-    title: str,
-    content: str,
-    theme_css: str,
-    is_dark: bool = False,
-    show_print_button: bool = False
-) -> str:
-    """
-    Generate a standalone HTML document for a note.
-    Uses marked.js for client-side markdown rendering.
 
-    Args:
-        title: The note title (for <title> and display)
-        content: Raw markdown content (images should already be base64 embedded)
-        theme_css: CSS content for theming
-        is_dark: Whether using a dark theme (for Mermaid/Highlight.js)
-        show_print_button: Whether to show a print button (for preview mode)
+# ============================================================================
+# Export HTML template
+#
+# The static document is split into constant segments at import time;
+# generate_export_html only joins them with the per-export values
+# (title, themes, CSS, toolbar, markdown) instead of re-formatting the
+# whole template on every call.
+# ============================================================================
 
-    Returns:
-        Complete HTML document as string
-    """
-    # Escape content for JavaScript string
-    escaped_content = (
-        content
-        .replace('\\', '\\\\')
-        .replace('`', '\\`')
-        .replace('$', '\\$')
-        .replace('</', '<\\/')  # Prevent </script> breaking
-    )
-    
-    highlight_theme = 'github-dark' if is_dark else 'github'
-    mermaid_theme = 'dark' if is_dark else 'default'
-    
-    # Print toolbar HTML (only shown in preview mode)
-    print_toolbar_html = '''
+# Markdown is escaped and streamed in slices of this many characters
+_EXPORT_STREAM_CHUNK_SIZE = 256 * 1024
+
+# Print toolbar HTML (only shown in preview mode)
+_PRINT_TOOLBAR_HTML = '''
     <div class="print-toolbar">
         <button onclick="window.print()" title="Print">
             <svg fill="none" stroke="currentColor" viewBox="0 0 24 24">
@@ -435,17 +744,21 @@ def generate_export_html(
             Close
         </button>
     </div>
-''' if show_print_button else ''
-    
-    html = f'''<!DOCTYPE html>
+'''
+
+_EXPORT_HTML_HEAD = '''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
+    <title>'''
+
+_EXPORT_HTML_AFTER_TITLE = '''</title>
     
     <!-- Highlight.js for code syntax highlighting -->
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.9.0/styles/{highlight_theme}.min.css">
+    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.9.0/styles/'''
+
+_EXPORT_HTML_AFTER_HIGHLIGHT_THEME = """.min.css">
     <script src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.9.0/highlight.min.js"></script>
     
     <!-- Marked.js for markdown parsing -->
@@ -456,80 +769,84 @@ def generate_export_html(
     
     <!-- MathJax for LaTeX math rendering -->
     <script>
-        MathJax = {{
-            tex: {{
+        MathJax = {
+            tex: {
                 inlineMath: [['\\\\(', '\\\\)'], ['$', '$']],
                 displayMath: [['\\\\[', '\\\\]'], ['$$', '$$']],
                 processEscapes: true,
                 processEnvironments: true
-            }},
-            options: {{
+            },
+            options: {
                 skipHtmlTags: ['script', 'noscript', 'style', 'textarea', 'pre', 'code']
-            }},
-            startup: {{
-                pageReady: () => {{
-                    return MathJax.startup.defaultPageReady().then(() => {{
+            },
+            startup: {
+                pageReady: () => {
+                    return MathJax.startup.defaultPageReady().then(() => {
                         // Highlight code blocks after MathJax is done
-                        document.querySelectorAll('pre code:not(.language-mermaid)').forEach((block) => {{
+                        document.querySelectorAll('pre code:not(.language-mermaid)').forEach((block) => {
                             hljs.highlightElement(block);
-                        }});
-                    }});
-                }}
-            }}
-        }};
+                        });
+                    });
+                }
+            }
+        };
     </script>
     <script src="https://cdn.jsdelivr.net/npm/mathjax@3.2.2/es5/tex-mml-chtml.js"></script>
     
     <!-- Mermaid.js for diagrams -->
     <script type="module">
         import mermaid from 'https://cdn.jsdelivr.net/npm/mermaid@11.12.2/dist/mermaid.esm.min.mjs';
-        mermaid.initialize({{ 
+        mermaid.initialize({ 
             startOnLoad: false,
-            theme: '{mermaid_theme}',
+            theme: '"""
+
+_EXPORT_HTML_AFTER_MERMAID_THEME = """',
             securityLevel: 'strict',
             fontFamily: 'inherit',
-            flowchart: {{ useMaxWidth: true }},
-            sequence: {{ useMaxWidth: true }},
-            gantt: {{ useMaxWidth: true }},
-            state: {{ useMaxWidth: true }},
-            er: {{ useMaxWidth: true }},
-            pie: {{ useMaxWidth: true }},
-            mindmap: {{ useMaxWidth: true }},
-            gitGraph: {{ useMaxWidth: true }}
-        }});
+            flowchart: { useMaxWidth: true },
+            sequence: { useMaxWidth: true },
+            gantt: { useMaxWidth: true },
+            state: { useMaxWidth: true },
+            er: { useMaxWidth: true },
+            pie: { useMaxWidth: true },
+            mindmap: { useMaxWidth: true },
+            gitGraph: { useMaxWidth: true }
+        });
         
         // Render Mermaid diagrams after page load
-        document.addEventListener('DOMContentLoaded', async () => {{
+        document.addEventListener('DOMContentLoaded', async () => {
             const mermaidBlocks = document.querySelectorAll('pre code.language-mermaid');
-            for (let i = 0; i < mermaidBlocks.length; i++) {{
+            for (let i = 0; i < mermaidBlocks.length; i++) {
                 const block = mermaidBlocks[i];
                 const pre = block.parentElement;
-                try {{
+                try {
                     const code = block.textContent;
                     const id = 'mermaid-diagram-' + i;
-                    const {{ svg }} = await mermaid.render(id, code);
+                    const { svg } = await mermaid.render(id, code);
                     const container = document.createElement('div');
                     container.className = 'mermaid-rendered';
                     container.style.cssText = 'background-color: transparent; padding: 20px; text-align: center; overflow-x: auto;';
                     container.innerHTML = svg;
                     pre.parentElement.replaceChild(container, pre);
-                }} catch (error) {{
+                } catch (error) {
                     console.error('Mermaid rendering error:', error);
-                }}
-            }}
-        }});
+                }
+            }
+        });
     </script>
     
     <style>
         /* Theme CSS */
-        {theme_css}
+        """
+
+_EXPORT_HTML_AFTER_THEME_CSS = '''
         
         /* Base styles */
-        * {{
+        * {
             box-sizing: border-box;
-        }}
+        }
         
-        body {{
+        body {
             font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif;
             margin: 0;
             padding: 2rem;
@@ -538,51 +855,51 @@ def generate_export_html(
             margin-right: auto;
             background-color: var(--bg-primary, #ffffff);
             color: var(--text-primary, #333333);
-        }}
+        }
         
         /* Markdown content styles */
-        .markdown-preview {{
+        .markdown-preview {
             line-height: 1.6;
-        }}
+        }
         
         .markdown-preview h1,
         .markdown-preview h2,
         .markdown-preview h3,
         .markdown-preview h4,
         .markdown-preview h5,
-        .markdown-preview h6 {{
+        .markdown-preview h6 {
             margin-top: 1.5em;
             margin-bottom: 0.5em;
             font-weight: 600;
             line-height: 1.25;
-        }}
+        }
         
-        .markdown-preview h1 {{ font-size: 2em; border-bottom: 1px solid var(--border-color, #e1e4e8); padding-bottom: 0.3em; }}
-        .markdown-preview h2 {{ font-size: 1.5em; border-bottom: 1px solid var(--border-color, #e1e4e8); padding-bottom: 0.3em; }}
-        .markdown-preview h3 {{ font-size: 1.25em; }}
-        .markdown-preview h4 {{ font-size: 1em; }}
+        .markdown-preview h1 { font-size: 2em; border-bottom: 1px solid var(--border-color, #e1e4e8); padding-bottom: 0.3em; }
+        .markdown-preview h2 { font-size: 1.5em; border-bottom: 1px solid var(--border-color, #e1e4e8); padding-bottom: 0.3em; }
+        .markdown-preview h3 { font-size: 1.25em; }
+        .markdown-preview h4 { font-size: 1em; }
         
-        .markdown-preview p {{
+        .markdown-preview p {
             margin: 1em 0;
-        }}
+        }
         
-        .markdown-preview a {{
+        .markdown-preview a {
             color: var(--accent-primary, #0366d6);
             text-decoration: none;
-        }}
+        }
         
-        .markdown-preview a:hover {{
+        .markdown-preview a:hover {
             text-decoration: underline;
-        }}
+        }
         
-        .markdown-preview img {{
+        .markdown-preview img {
             max-width: 100%;
             height: auto;
             border-radius: 4px;
-        }}
+        }
         
         /* Inline code */
-        .markdown-preview code:not(pre code) {{ 
+        .markdown-preview code:not(pre code) { 
             background-color: var(--bg-tertiary, #f6f8fa);
             color: var(--accent-primary, #0366d6);
             padding: 0.2rem 0.4rem;
@@ -590,18 +907,18 @@ def generate_export_html(
             font-size: 0.875rem;
             font-family: 'Monaco', 'Menlo', 'Ubuntu Mono', monospace;
             font-weight: 500;
-        }}
+        }
         
         /* Code blocks */
-        .markdown-preview pre {{ 
+        .markdown-preview pre { 
             background-color: var(--bg-tertiary, #f6f8fa);
             margin-bottom: 1.5rem;
             border-radius: 0.5rem;
             overflow-x: auto;
             border: 1px solid var(--border-primary, #e1e4e8);
-        }}
+        }
         
-        .markdown-preview pre code {{
+        .markdown-preview pre code {
             background: transparent;
             padding: 1rem;
             display: block;
@@ -609,167 +926,167 @@ def generate_export_html(
             line-height: 1.6;
             font-family: 'Monaco', 'Menlo', 'Ubuntu Mono', monospace;
             color: inherit;
-        }}
+        }
         
-        .markdown-preview blockquote {{
+        .markdown-preview blockquote {
             margin: 1em 0;
             padding: 0 1em;
             border-left: 4px solid var(--accent-primary, #0366d6);
             color: var(--text-secondary, #6a737d);
-        }}
+        }
 
         /* Callouts — mirror the in-app preview. */
-        .markdown-preview .callout {{
+        .markdown-preview .callout {
             margin: 1rem 0;
             padding: 0.75rem 1rem;
             border-left: 4px solid var(--callout-color, var(--accent-primary, #0366d6));
             border-radius: 0.375rem;
             background: var(--callout-bg, var(--bg-secondary, #f6f8fa));
-        }}
-        .markdown-preview .callout-title {{
+        }
+        .markdown-preview .callout-title {
             display: flex;
             align-items: center;
             gap: 0.5rem;
             font-weight: 600;
             color: var(--callout-color, var(--accent-primary, #0366d6));
             margin-bottom: 0.25rem;
-        }}
-        .markdown-preview .callout-icon {{
+        }
+        .markdown-preview .callout-icon {
             font-size: 1.1em;
             line-height: 1;
-        }}
-        .markdown-preview .callout-body > :first-child {{ margin-top: 0; }}
-        .markdown-preview .callout-body > :last-child  {{ margin-bottom: 0; }}
-        .markdown-preview .callout-note      {{ --callout-color: #0969da; --callout-bg: rgba(9, 105, 218, 0.08); }}
-        .markdown-preview .callout-tip       {{ --callout-color: #1a7f37; --callout-bg: rgba(26, 127, 55, 0.08); }}
-        .markdown-preview .callout-important {{ --callout-color: #8250df; --callout-bg: rgba(130, 80, 223, 0.08); }}
-        .markdown-preview .callout-warning   {{ --callout-color: #9a6700; --callout-bg: rgba(154, 103, 0, 0.08); }}
-        .markdown-preview .callout-caution   {{ --callout-color: #d1242f; --callout-bg: rgba(209, 36, 47, 0.08); }}
+        }
+        .markdown-preview .callout-body > :first-child { margin-top: 0; }
+        .markdown-preview .callout-body > :last-child  { margin-bottom: 0; }
+        .markdown-preview .callout-note      { --callout-color: #0969da; --callout-bg: rgba(9, 105, 218, 0.08); }
+        .markdown-preview .callout-tip       { --callout-color: #1a7f37; --callout-bg: rgba(26, 127, 55, 0.08); }
+        .markdown-preview .callout-important { --callout-color: #8250df; --callout-bg: rgba(130, 80, 223, 0.08); }
+        .markdown-preview .callout-warning   { --callout-color: #9a6700; --callout-bg: rgba(154, 103, 0, 0.08); }
+        .markdown-preview .callout-caution   { --callout-color: #d1242f; --callout-bg: rgba(209, 36, 47, 0.08); }
 
         .markdown-preview ul,
-        .markdown-preview ol {{
+        .markdown-preview ol {
             padding-left: 2em;
             margin: 1em 0;
-        }}
+        }
         
-        .markdown-preview li {{
+        .markdown-preview li {
             margin: 0.25em 0;
-        }}
+        }
         
-        .markdown-preview table {{
+        .markdown-preview table {
             border-collapse: collapse;
             width: 100%;
             margin: 1em 0;
-        }}
+        }
         
         .markdown-preview th,
-        .markdown-preview td {{
+        .markdown-preview td {
             border: 1px solid var(--border-color, #e1e4e8);
             padding: 0.5em 1em;
             text-align: left;
-        }}
-        .markdown-preview th[align="left"],   .markdown-preview td[align="left"]   {{ text-align: left; }}
-        .markdown-preview th[align="right"],  .markdown-preview td[align="right"]  {{ text-align: right; }}
-        .markdown-preview th[align="center"], .markdown-preview td[align="center"] {{ text-align: center; }}
+        }
+        .markdown-preview th[align="left"],   .markdown-preview td[align="left"]   { text-align: left; }
+        .markdown-preview th[align="right"],  .markdown-preview td[align="right"]  { text-align: right; }
+        .markdown-preview th[align="center"], .markdown-preview td[align="center"] { text-align: center; }
         
-        .markdown-preview th {{
+        .markdown-preview th {
             background-color: var(--bg-secondary, #f6f8fa);
             font-weight: 600;
-        }}
+        }
         
-        .markdown-preview hr {{
+        .markdown-preview hr {
             border: none;
             border-top: 1px solid var(--border-color, #e1e4e8);
             margin: 2em 0;
-        }}
+        }
         
         /* Task list styling */
-        .markdown-preview input[type="checkbox"] {{
+        .markdown-preview input[type="checkbox"] {
             margin-right: 0.5em;
-        }}
-        .markdown-preview li:has(> input[type="checkbox"]) {{
+        }
+        .markdown-preview li:has(> input[type="checkbox"]) {
             list-style: none;
             margin-left: -1.25em;
-        }}
+        }
         
         /* Enhanced Shell/Bash Syntax Highlighting */
         .markdown-preview pre code.language-shell .hljs-meta,
         .markdown-preview pre code.language-bash .hljs-meta,
-        .markdown-preview pre code.language-sh .hljs-meta {{
+        .markdown-preview pre code.language-sh .hljs-meta {
             color: #7c3aed !important;
             font-weight: 600;
-        }}
+        }
         
         .markdown-preview pre code.language-shell .hljs-built_in,
         .markdown-preview pre code.language-bash .hljs-built_in,
-        .markdown-preview pre code.language-sh .hljs-built_in {{
+        .markdown-preview pre code.language-sh .hljs-built_in {
             color: #10b981 !important;
             font-weight: 500;
-        }}
+        }
         
         .markdown-preview pre code.language-shell .hljs-string,
         .markdown-preview pre code.language-bash .hljs-string,
-        .markdown-preview pre code.language-sh .hljs-string {{
+        .markdown-preview pre code.language-sh .hljs-string {
             color: #f59e0b !important;
-        }}
+        }
         
         .markdown-preview pre code.language-shell .hljs-variable,
         .markdown-preview pre code.language-bash .hljs-variable,
-        .markdown-preview pre code.language-sh .hljs-variable {{
+        .markdown-preview pre code.language-sh .hljs-variable {
             color: #06b6d4 !important;
             font-weight: 500;
-        }}
+        }
         
         .markdown-preview pre code.language-shell .hljs-comment,
         .markdown-preview pre code.language-bash .hljs-comment,
-        .markdown-preview pre code.language-sh .hljs-comment {{
+        .markdown-preview pre code.language-sh .hljs-comment {
             color: #6b7280 !important;
             font-style: italic;
-        }}
+        }
         
         .markdown-preview pre code.language-shell .hljs-keyword,
         .markdown-preview pre code.language-bash .hljs-keyword,
-        .markdown-preview pre code.language-sh .hljs-keyword {{
+        .markdown-preview pre code.language-sh .hljs-keyword {
             color: #ec4899 !important;
             font-weight: 600;
-        }}
+        }
         
         /* Enhanced PowerShell Syntax Highlighting */
         .markdown-preview pre code.language-powershell .hljs-built_in,
-        .markdown-preview pre code.language-ps1 .hljs-built_in {{
+        .markdown-preview pre code.language-ps1 .hljs-built_in {
             color: #10b981 !important;
             font-weight: 600;
-        }}
+        }
         
         .markdown-preview pre code.language-powershell .hljs-variable,
-        .markdown-preview pre code.language-ps1 .hljs-variable {{
+        .markdown-preview pre code.language-ps1 .hljs-variable {
             color: #06b6d4 !important;
             font-weight: 500;
-        }}
+        }
         
         .markdown-preview pre code.language-powershell .hljs-string,
-        .markdown-preview pre code.language-ps1 .hljs-string {{
+        .markdown-preview pre code.language-ps1 .hljs-string {
             color: #f59e0b !important;
-        }}
+        }
         
         .markdown-preview pre code.language-powershell .hljs-keyword,
-        .markdown-preview pre code.language-ps1 .hljs-keyword {{
+        .markdown-preview pre code.language-ps1 .hljs-keyword {
             color: #ec4899 !important;
             font-weight: 600;
-        }}
+        }
         
         .markdown-preview pre code.language-powershell .hljs-comment,
-        .markdown-preview pre code.language-ps1 .hljs-comment {{
+        .markdown-preview pre code.language-ps1 .hljs-comment {
             color: #6b7280 !important;
             font-style: italic;
-        }}
+        }
         
         /* Copy button for code blocks */
-        .markdown-preview pre {{
+        .markdown-preview pre {
             position: relative;
-        }}
+        }
         
-        .copy-btn {{
+        .copy-btn {
             position: absolute;
             top: 0.5rem;
             right: 0.5rem;
@@ -783,42 +1100,42 @@ def generate_export_html(
             opacity: 0;
             transition: opacity 0.2s ease;
             font-family: -apple-system, BlinkMacSystemFont, sans-serif;
-        }}
+        }
         
-        .markdown-preview pre:hover .copy-btn {{
+        .markdown-preview pre:hover .copy-btn {
             opacity: 1;
-        }}
+        }
         
-        .copy-btn:hover {{
+        .copy-btn:hover {
             background-color: var(--accent-primary, #0366d6);
             color: white;
             border-color: var(--accent-primary, #0366d6);
-        }}
+        }
         
-        .copy-btn.copied {{
+        .copy-btn.copied {
             background-color: #10b981;
             color: white;
             border-color: #10b981;
-        }}
+        }
         
-        @media (max-width: 768px) {{
-            body {{
+        @media (max-width: 768px) {
+            body {
                 padding: 1rem;
-            }}
-        }}
+            }
+        }
         
-        @media print {{
-            body {{
+        @media print {
+            body {
                 padding: 0.5in;
                 max-width: none;
-            }}
-            .print-toolbar {{
+            }
+            .print-toolbar {
                 display: none !important;
-            }}
-        }}
+            }
+        }
         
         /* Print toolbar (only shown in preview mode) */
-        .print-toolbar {{
+        .print-toolbar {
             position: fixed;
             top: 1rem;
             right: 1rem;
@@ -830,9 +1147,9 @@ def generate_export_html(
             border-radius: 0.5rem;
             box-shadow: 0 2px 8px rgba(0, 0, 0, 0.15);
             border: 1px solid var(--border-primary, #dee2e6);
-        }}
+        }
         
-        .print-toolbar button {{
+        .print-toolbar button {
             display: flex;
             align-items: center;
             gap: 0.375rem;
@@ -845,49 +1162,53 @@ def generate_export_html(
             font-size: 0.875rem;
             font-family: inherit;
             transition: background-color 0.15s, border-color 0.15s;
-        }}
+        }
         
-        .print-toolbar button:hover {{
+        .print-toolbar button:hover {
             background: var(--bg-tertiary, #e9ecef);
             border-color: var(--accent-primary, #0366d6);
-        }}
+        }
         
-        .print-toolbar button svg {{
+        .print-toolbar button svg {
             width: 1rem;
             height: 1rem;
-        }}
+        }
     </style>
 </head>
 <body>
-    {print_toolbar_html}
+    '''
+
+_EXPORT_HTML_AFTER_TOOLBAR = '''
     <div class="markdown-preview" id="content"></div>
 
     <script>
         // Protect LaTeX delimiters \\(...\\) and \\[...\\] from marked.js escaping
-        marked.use({{
-            extensions: [{{
+        marked.use({
+            extensions: [{
                 name: 'protectLatexMath',
                 level: 'inline',
-                start(src) {{ return src.match(/\\\\[\\(\\[]/)?.index; }},
-                tokenizer(src) {{
+                start(src) { return src.match(/\\\\[\\(\\[]/)?.index; },
+                tokenizer(src) {
                     const match = src.match(/^(\\\\[\\(\\[])([\\s\\S]*?)(\\\\[\\)\\]])/);
-                    if (match) {{
-                        return {{ type: 'html', raw: match[0], text: match[0] }};
-                    }}
-                }}
-            }}]
-        }});
+                    if (match) {
+                        return { type: 'html', raw: match[0], text: match[0] };
+                    }
+                }
+            }]
+        });
 
         // Configure marked
-        marked.setOptions({{
+        marked.setOptions({
             gfm: true,
             breaks: true,
             headerIds: true,
             mangle: false
-        }});
+        });
 
         // Raw markdown content
-        const markdown = `{escaped_content}`;
+        const markdown = '''
+
+_EXPORT_HTML_TAIL = ''';
 
         // GFM/GLFM callouts. Runs BEFORE code-block extraction so fences
         // nested in a callout blockquote lose their `> ` prefix on the closer
@@ -896,11 +1217,11 @@ def generate_export_html(
         // Fence-aware so literal `> [!TIP]` inside a top-level code block
         // is not misread. Mirrors the in-app preview preprocessor.
         let processed;
-        {{
+        {
             const CALLOUT_RE = /^>\\s*\\[!(NOTE|TIP|IMPORTANT|WARNING|CAUTION)\\]\\s*(.*)$/i;
-            const CALLOUT_ICONS = {{ note: 'ℹ️', tip: '💡', important: '❗', warning: '⚠️', caution: '🛑' }};
-            const CALLOUT_TITLES = {{ note: 'Note', tip: 'Tip', important: 'Important', warning: 'Warning', caution: 'Caution' }};
-            const FENCE_OPEN_RE = /^\\s{{0,3}}(`{{3,}}|~{{3,}})/;
+            const CALLOUT_ICONS = { note: 'ℹ️', tip: '💡', important: '❗', warning: '⚠️', caution: '🛑' };
+            const CALLOUT_TITLES = { note: 'Note', tip: 'Tip', important: 'Important', warning: 'Warning', caution: 'Caution' };
+            const FENCE_OPEN_RE = /^\\s{0,3}(`{3,}|~{3,})/;
             const escapeAttr = (s) => s.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
 
             const srcLines = markdown.split('\\n');
@@ -908,34 +1229,34 @@ def generate_export_html(
             let li = 0;
             let fenceChar = null;
             let fenceLen = 0;
-            while (li < srcLines.length) {{
+            while (li < srcLines.length) {
                 const line = srcLines[li];
-                if (fenceChar) {{
+                if (fenceChar) {
                     outLines.push(line);
-                    const closeRe = new RegExp('^\\\\s{{0,3}}' + (fenceChar === '`' ? '`' : '~') + '{{' + fenceLen + ',}}\\\\s*$');
-                    if (closeRe.test(line)) {{ fenceChar = null; fenceLen = 0; }}
+                    const closeRe = new RegExp('^\\\\s{0,3}' + (fenceChar === '`' ? '`' : '~') + '{' + fenceLen + ',}\\\\s*$');
+                    if (closeRe.test(line)) { fenceChar = null; fenceLen = 0; }
                     li++;
                     continue;
-                }}
+                }
                 const fenceOpen = line.match(FENCE_OPEN_RE);
-                if (fenceOpen) {{
+                if (fenceOpen) {
                     fenceChar = fenceOpen[1][0];
                     fenceLen = fenceOpen[1].length;
                     outLines.push(line);
                     li++;
                     continue;
-                }}
+                }
                 const m = line.match(CALLOUT_RE);
-                if (!m) {{ outLines.push(line); li++; continue; }}
+                if (!m) { outLines.push(line); li++; continue; }
                 const type = m[1].toLowerCase();
                 const title = escapeAttr((m[2] || '').trim() || CALLOUT_TITLES[type]);
                 const icon = CALLOUT_ICONS[type];
                 const bodyLines = [];
                 li++;
-                while (li < srcLines.length && srcLines[li].startsWith('>')) {{
+                while (li < srcLines.length && srcLines[li].startsWith('>')) {
                     bodyLines.push(srcLines[li].replace(/^>\\s?/, ''));
                     li++;
-                }}
+                }
                 outLines.push(
                     '',
                     '<div class="callout callout-' + type + '">',
@@ -948,7 +1269,7 @@ def generate_export_html(
                     '</div>',
                     ''
                 );
-            }}
+            }
             processed = outLines.join('\\n');
 
             // Escape same-line block-starters after a task marker so they
@@ -961,7 +1282,7 @@ def generate_export_html(
                 /^(\\s*[-*+]\\s+\\[[xX ]\\]\\s+)([#>*+\\-])(\\s)/gm,
                 '$1\\\\$2$3'
             );
-        }}
+        }
 
         // Render markdown with XSS sanitization
         // DOMPurify strips scripts, iframes, and event handlers while allowing safe HTML/SVG
@@ -975,7 +1296,7 @@ def generate_export_html(
         // walker handles the standard-markdown case `![alt|100](x)`. Mirrors
         // parseImageSizeSpec() in frontend/app.js (allowSolo=false here, since
         // standard markdown `![100](x)` should stay as alt="100").
-        document.querySelectorAll('.markdown-preview img').forEach(img => {{
+        document.querySelectorAll('.markdown-preview img').forEach(img => {
             const rawAlt = img.getAttribute('alt') || '';
             const idx = rawAlt.lastIndexOf('|');
             if (idx === -1) return;
@@ -984,50 +1305,126 @@ def generate_export_html(
             if (!m) return;
             const w = parseInt(m[1], 10);
             const h = m[2] !== undefined ? parseInt(m[2], 10) : null;
-            if (w > 0 && !img.hasAttribute('width')) {{
+            if (w > 0 && !img.hasAttribute('width')) {
                 img.setAttribute('width', String(w));
                 img.style.width = w + 'px';
-            }}
-            if (h !== null && h > 0 && !img.hasAttribute('height')) {{
+            }
+            if (h !== null && h > 0 && !img.hasAttribute('height')) {
                 img.setAttribute('height', String(h));
                 img.style.height = h + 'px';
-            }}
+            }
             const cleanAlt = rawAlt.slice(0, idx).trim();
             img.setAttribute('alt', cleanAlt);
             if (img.getAttribute('title') === rawAlt) img.setAttribute('title', cleanAlt);
-        }});
+        });
         
         // Typeset math after content is inserted
-        if (typeof MathJax !== 'undefined' && MathJax.typeset) {{
+        if (typeof MathJax !== 'undefined' && MathJax.typeset) {
             MathJax.typeset();
-        }}
+        }
         
         // Add copy buttons to code blocks
-        document.querySelectorAll('.markdown-preview pre').forEach(pre => {{
+        document.querySelectorAll('.markdown-preview pre').forEach(pre => {
             const btn = document.createElement('button');
             btn.className = 'copy-btn';
             btn.textContent = 'Copy';
-            btn.addEventListener('click', async () => {{
+            btn.addEventListener('click', async () => {
                 const code = pre.querySelector('code');
-                if (code) {{
-                    try {{
+                if (code) {
+                    try {
                         await navigator.clipboard.writeText(code.textContent);
                         btn.textContent = 'Copied!';
                         btn.classList.add('copied');
-                        setTimeout(() => {{
+                        setTimeout(() => {
                             btn.textContent = 'Copy';
                             btn.classList.remove('copied');
-                        }}, 2000);
-                    }} catch (err) {{
+                        }, 2000);
+                    } catch (err) {
                         btn.textContent = 'Failed';
                         setTimeout(() => btn.textContent = 'Copy', 2000);
-                    }}
-                }}
-            }});
+                    }
+                }
+            });
             pre.appendChild(btn);
-        }});
+        });
     </script>
 </body>
 </html>'''
+
+
+@functools.lru_cache(maxsize=8)
+def _build_export_head(theme_css: str, is_dark: bool) -> str:
+    """
+    Everything between </title> and the print toolbar. It depends only on the
+    theme, so consecutive exports with the same theme reuse one string.
+    """
+    highlight_theme = 'github-dark' if is_dark else 'github'
+    mermaid_theme = 'dark' if is_dark else 'default'
+    return ''.join((
+        _EXPORT_HTML_AFTER_TITLE, highlight_theme,
+        _EXPORT_HTML_AFTER_HIGHLIGHT_THEME, mermaid_theme,
+        _EXPORT_HTML_AFTER_MERMAID_THEME, theme_css,
+        _EXPORT_HTML_AFTER_THEME_CSS,
+    ))
+
+
+def generate_export_html_stream(
+    title: str,
+    content: str,
+    theme_css: str,
+    is_dark: bool = False,
+    show_print_button: bool = False
+) -> Iterator[str]:
+    """
+    Generate a standalone HTML document for a note as a sequence of chunks.
+    Same arguments and output as generate_export_html, but the markdown is
+    escaped and yielded in slices so the full document never has to exist
+    as one string (e.g. for a StreamingResponse).
+    """
+    # Title is interpolated into <title>; escape so it cannot inject markup
+    title = html.escape(title, quote=False)
+    
+    yield _EXPORT_HTML_HEAD
+    yield title
+    yield _build_export_head(theme_css, is_dark)
+    if show_print_button:
+        yield _PRINT_TOOLBAR_HTML
+    yield _EXPORT_HTML_AFTER_TOOLBAR
+    
+    # Embed content as a JSON string literal (valid JavaScript). JSON escaping
+    # is per character, so slices can be escaped independently and placed
+    # inside one pair of quotes. Escaping every '<' keeps </script> and <!--
+    # in the note from ending the script block.
+    yield '"'
+    for start in range(0, len(content), _EXPORT_STREAM_CHUNK_SIZE):
+        piece = content[start:start + _EXPORT_STREAM_CHUNK_SIZE]
+        yield json.dumps(piece, ensure_ascii=False)[1:-1].replace('<', '\\u003c')
+    yield '"'
     
-    return html
+    yield _EXPORT_HTML_TAIL
+
+
+def generate_export_html(
+    title: str,
+    content: str,
+    theme_css: str,
+    is_dark: bool = False,
+    show_print_button: bool = False
+) -> str:
+    """
+    Generate a standalone HTML document for a note.
+    Uses marked.js for client-side markdown rendering.
+
+    Args:
+        title: The note title (for <title> and display)
+        content: Raw markdown content (images should already be base64 embedded)
+        theme_css: CSS content for theming
+        is_dark: Whether using a dark theme (for Mermaid/Highlight.js)
+        show_print_button: Whether to show a print button (for preview mode)
+
+    Returns:
+        Complete HTML document as string
+    """
+    return ''.join(generate_export_html_stream(
+        title, content, theme_css, is_dark, show_print_button
+    ))
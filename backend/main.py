@@ -5,7 +5,7 @@ Main FastAPI application
 
 from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Form, Depends, APIRouter, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, RedirectResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, APIKeyHeader
 from starlette.middleware.sessions import SessionMiddleware
@@ -14,7 +14,7 @@ import yaml
 import json
 import logging
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import aiofiles
 from datetime import datetime
 import bcrypt
@@ -63,7 +63,14 @@ from .share import (
     update_token_path,
     get_all_shared_paths,
 )
-from .export import generate_export_html, embed_images_as_base64, convert_wikilinks_to_html, strip_frontmatter
+from .export import (
+    generate_export_html,
+    generate_export_html_stream,
+    embed_images_as_base64,
+    collect_images_as_sidecar,
+    convert_wikilinks_to_html,
+    strip_frontmatter,
+)
 
 # Load configuration
 config_path = Path(__file__).parent.parent / "config.yaml"
@@ -1415,8 +1422,10 @@ async def export_note_to_html(request: Request, note_path: str, theme: Optional[
         # Get note title
         title = Path(note_path).stem
         
-        # Generate HTML (show print button only when not downloading)
-        html_content = generate_export_html(
+        # Generate HTML (show print button only when not downloading).
+        # Streamed so notes with many embedded images are never held in
+        # memory a second time as one complete document string.
+        html_chunks = generate_export_html_stream(
             title=title,
             content=content_with_links,
             theme_css=theme_css,
@@ -1427,8 +1436,8 @@ async def export_note_to_html(request: Request, note_path: str, theme: Optional[
         # Return as downloadable file or inline (for print preview)
         if download:
             filename = f"{title}.html"
-            return Response(
-                content=html_content,
+            return StreamingResponse(
+                html_chunks,
                 media_type="text/html",
                 headers={
                     "Content-Disposition": f'attachment; filename="{filename}"'
@@ -1436,7 +1445,7 @@ async def export_note_to_html(request: Request, note_path: str, theme: Optional[
             )
         else:
             # Return inline for browser display (print preview)
-            return HTMLResponse(content=html_content)
+            return StreamingResponse(html_chunks, media_type="text/html")
     except HTTPException:
         raise
     except Exception as e:
@@ -1730,6 +1739,31 @@ async def delete_share(request: Request, note_path: str):
 # Public Share Endpoint (no authentication required)
 # ============================================================================
 
+# Image map of each shared note, as computed by view_shared_note.
+# key: token -> (note_path, note_mtime_ns, {relative path: resolved path})
+# The media route looks files up here instead of re-resolving every image in
+# the note on each request; a moved or edited note misses and is re-derived.
+_SHARED_MEDIA_CACHE_MAX = 256
+_SHARED_MEDIA_CACHE: Dict[str, Tuple[str, int, Dict[str, Path]]] = {}
+
+
+def _note_mtime_ns(notes_dir: Path, note_path: str) -> Optional[int]:
+    try:
+        return (notes_dir / note_path).stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _remember_shared_media(token: str, note_path: str, mtime_ns: Optional[int], media_files: Dict[str, Path]) -> None:
+    if mtime_ns is None:
+        return
+    _SHARED_MEDIA_CACHE.pop(token, None)
+    _SHARED_MEDIA_CACHE[token] = (note_path, mtime_ns, media_files)
+    # Evict the least recently stored entry
+    while len(_SHARED_MEDIA_CACHE) > _SHARED_MEDIA_CACHE_MAX:
+        _SHARED_MEDIA_CACHE.pop(next(iter(_SHARED_MEDIA_CACHE)))
+
+
 @app.get("/share/{token}", response_class=HTMLResponse, tags=["Sharing"])
 @limiter.limit("60/minute")
 async def view_shared_note(request: Request, token: str):
@@ -1748,6 +1782,10 @@ async def view_shared_note(request: Request, token: str):
         note_path = share_info['path']
         theme = share_info.get('theme', 'light')
         
+        # Stat before reading, so an edit in between can only make the cached
+        # image map look stale, never fresh
+        mtime_ns = _note_mtime_ns(notes_dir, note_path)
+        
         # Read note content
         content = get_note_content(str(notes_dir), note_path)
         if content is None:
@@ -1762,8 +1800,12 @@ async def view_shared_note(request: Request, token: str):
         note_file_path = notes_dir / note_path
         note_folder = note_file_path.parent
         
-        # Embed images as base64
-        content_with_images = embed_images_as_base64(content, note_folder, notes_dir)
+        # Link images to the token-scoped media route instead of embedding them
+        # as base64, so browsers can cache them across views
+        content_with_images, media_files = collect_images_as_sidecar(
+            content, note_folder, notes_dir, f"/share/{token}/media/"
+        )
+        _remember_shared_media(token, note_path, mtime_ns, media_files)
         
         # Convert wikilinks to decorative HTML links
         content_with_links = convert_wikilinks_to_html(content_with_images)
@@ -1801,6 +1843,51 @@ async def view_shared_note(request: Request, token: str):
         raise HTTPException(status_code=500, detail=safe_error_message(e, "Failed to load shared note"))
 
 
+@app.get("/share/{token}/media/{media_path:path}", tags=["Sharing"])
+@limiter.limit("300/minute")
+async def get_shared_note_media(request: Request, token: str, media_path: str):
+    """
+    Serve an image referenced by a shared note.
+    No authentication required, but only files the shared note itself
+    references can be fetched through its token.
+    """
+    try:
+        notes_dir = Path(config['storage']['notes_dir'])
+        
+        share_info = get_note_by_token(str(notes_dir), token)
+        if not share_info:
+            raise HTTPException(status_code=404, detail="Shared note not found or link expired")
+        
+        note_path = share_info['path']
+        mtime_ns = _note_mtime_ns(notes_dir, note_path)
+        cached = _SHARED_MEDIA_CACHE.get(token)
+        if cached is not None and mtime_ns is not None and cached[:2] == (note_path, mtime_ns):
+            media_files = cached[2]
+        else:
+            content = get_note_content(str(notes_dir), note_path)
+            if content is None:
+                raise HTTPException(status_code=404, detail="Note no longer exists")
+            
+            # Re-derive the note's image set; anything else is not shared
+            note_folder = (notes_dir / note_path).parent
+            _content, media_files = collect_images_as_sidecar(
+                strip_frontmatter(content), note_folder, notes_dir, f"/share/{token}/media/"
+            )
+            _remember_shared_media(token, note_path, mtime_ns, media_files)
+        
+        full_path = media_files.get(media_path)
+        # Cached paths were resolved when the map was built; refuse one that
+        # has since vanished or been swapped for a symlink
+        if full_path is None or not full_path.is_file() or os.path.realpath(full_path) != str(full_path):
+            raise HTTPException(status_code=404, detail="File not found")
+        
+        return FileResponse(full_path, headers={"Cache-Control": "private, max-age=3600"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=safe_error_message(e, "Failed to load media file"))
+
+
 @app.get("/health", tags=["System"])
 async def health_check():
     """Health check endpoint"""
@@ -144,6 +144,9 @@ _SCAN_WALK_CACHE_LOCK = threading.Lock()
 _SCAN_WALK_CACHE_TTL_SECONDS = 1.0
 # key: (resolved_notes_dir, include_media) -> (cached_at_monotonic_seconds, (notes, folders))
 _SCAN_WALK_CACHE: Dict[Tuple[str, bool], Tuple[float, Tuple[List[Dict], List[str]]]] = {}
+# Bumped on every invalidation so caches living outside this module (the
+# attachment index in export.py) can tell that the vault was mutated.
+_SCAN_GENERATION = 0
 
 
 def _scan_cache_get(key: Tuple[str, bool]) -> Optional[Tuple[List[Dict], List[str]]]:
@@ -166,8 +169,15 @@ def _scan_cache_set(key: Tuple[str, bool], value: Tuple[List[Dict], List[str]])
 
 def _scan_cache_invalidate() -> None:
     """Drop the TTL scan cache. Called from every mutation handler."""
+    global _SCAN_GENERATION
     with _SCAN_WALK_CACHE_LOCK:
         _SCAN_WALK_CACHE.clear()
+        _SCAN_GENERATION += 1
+
+
+def _scan_generation() -> int:
+    """Current invalidation generation; changes whenever the vault is mutated."""
+    return _SCAN_GENERATION
 
 
 def ensure_index_built(notes_dir: str) -> None:
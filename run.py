@@ -4,8 +4,10 @@ Quick start script for NoteDiscovery
 Run this to start the application without Docker
 """
 
+import importlib.util
 import sys
 import os
+import re
 import subprocess
 from pathlib import Path
 
@@ -15,6 +17,26 @@ try:
 except ImportError:
     colorama = None
 
+# Top-level `server:` block: the key line plus every following line that is
+# indented, blank or a comment.
+_SERVER_BLOCK_RE = re.compile(r'^server[ \t]*:[ \t]*(?:#.*)?\n((?:(?:[ \t]+.*|[ \t]*(?:#.*)?)(?:\n|$))*)', re.MULTILINE)
+_SERVER_PORT_RE = re.compile(r'^([ \t]+)port[ \t]*:[ \t]*(\d+)[ \t]*(?:#.*)?$', re.MULTILINE)
+
+
+def _read_config_port(text):
+    """Find server.port with a line scan; None when the layout isn't the plain one."""
+    block = _SERVER_BLOCK_RE.search(text)
+    if not block:
+        return None
+    body = block.group(1)
+    first_key = re.search(r'^([ \t]+)[^ \t#\n]', body, re.MULTILINE)
+    for m in _SERVER_PORT_RE.finditer(body):
+        # Only a direct child of `server:`, not a nested mapping's port
+        if first_key and m.group(1) == first_key.group(1):
+            return m.group(2)
+    return None
+
+
 def get_port():
     """Get port from: 1) PORT env var, 2) config.yaml, 3) default 8000."""
     if os.getenv("PORT"):
@@ -22,35 +44,40 @@ def get_port():
     config_path = Path("config.yaml")
     if config_path.exists():
         try:
+            text = config_path.read_text(encoding='utf-8')
+            port = _read_config_port(text)
+            if port is not None:
+                return port
+            # Unusual layout (flow style, anchors...) - let PyYAML handle it
             import yaml
-            with open(config_path, 'r', encoding='utf-8') as f:
-                cfg = yaml.safe_load(f) or {}
-                return str(cfg.get('server', {}).get('port', 8000))
+            cfg = yaml.safe_load(text) or {}
+            return str(cfg.get('server', {}).get('port', 8000))
         except Exception:
             pass
     return "8000"
 
 
 def main():
-    try:
-        import fastapi  # noqa: F401
-        import uvicorn  # noqa: F401
-    except ImportError:
+    # find_spec only locates the packages; importing FastAPI here would be
+    # wasted work since the server process imports it again.
+    if importlib.util.find_spec("fastapi") is None or importlib.util.find_spec("uvicorn") is None:
         print("Installing dependencies...")
         subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
+        importlib.invalidate_caches()
 
     port = get_port()
     print(f"📝 NoteDiscovery → http://localhost:{port}  (Ctrl+C to stop)")
     print()
 
-    subprocess.call([
-        sys.executable, "-m", "uvicorn",
+    # Run uvicorn in this interpreter instead of spawning `python -m uvicorn`
+    import uvicorn
+    uvicorn.run(
         "backend.main:app",
-        "--reload",
-        "--host", "0.0.0.0",
-        "--port", port,
-        "--timeout-graceful-shutdown", "2"
-    ])
+        reload=True,
+        host="0.0.0.0",
+        port=int(port),
+        timeout_graceful_shutdown=2
+    )
 
 if __name__ == "__main__":
     main()